@@ -5,9 +5,24 @@ Run this once on a pod with your network volume mounted.
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-from huggingface_hub import snapshot_download
+# Use the Rust-based hf_transfer client for much faster downloads if installed.
+# Must be set before huggingface_hub is imported, since it reads the flag at import.
+try:
+    import hf_transfer  # noqa: F401
+    os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
+except ImportError:
+    print("⚠ hf_transfer not installed - falling back to default downloader")
+    print("  (pip install huggingface_hub[hf_transfer] for faster downloads)")
+
+from huggingface_hub import HfApi, hf_hub_download
+from huggingface_hub.utils import filter_repo_objects
+from tqdm import tqdm
+
+# Number of files to download concurrently
+MAX_WORKERS = int(os.getenv("HF_DOWNLOAD_WORKERS", "8"))
 
 
 def download_model(model_name: str, cache_dir: str):
@@ -42,14 +57,37 @@ def download_model(model_name: str, cache_dir: str):
     print("Downloading only inference-required files...")
     print("(Excluding training scripts, docs, git files, etc.)")
     
-    # Download model using HuggingFace Hub
-    downloaded_path = snapshot_download(
-        repo_id=model_name,
-        cache_dir=cache_dir,
-        local_dir=cache_path / model_name.replace("/", "--"),
-        local_dir_use_symlinks=False,
-        allow_patterns=allow_patterns,
-    )
+    # Resolve the revision once so every file comes from the same commit, even if
+    # the repo is updated mid-download, then download matching files in parallel
+    local_dir = cache_path / model_name.replace("/", "--")
+    model_info = HfApi().model_info(model_name)
+    repo_files = [sibling.rfilename for sibling in model_info.siblings]
+    filenames = list(filter_repo_objects(repo_files, allow_patterns=allow_patterns))
+    print(f"Downloading {len(filenames)} files from revision {model_info.sha} "
+          f"with {MAX_WORKERS} workers...")
+    
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(
+                hf_hub_download,
+                repo_id=model_name,
+                filename=filename,
+                revision=model_info.sha,
+                cache_dir=cache_dir,
+                local_dir=local_dir,
+            ): filename
+            for filename in filenames
+        }
+        with tqdm(total=len(futures), desc="Files", unit="file") as progress:
+            for future in as_completed(futures):
+                # Raise the first download error with the file that caused it
+                try:
+                    future.result()
+                except Exception as e:
+                    raise RuntimeError(f"Failed to download {futures[future]}: {e}") from e
+                progress.update(1)
+    
+    downloaded_path = str(local_dir)
     
     print("-" * 60)
     print(f"✓ Model downloaded successfully to: {downloaded_path}")
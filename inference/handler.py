@@ -1,18 +1,31 @@
 """FIBO Image Generation Handler with R2 Storage"""
 
+import bisect
+import functools
 import gc
 import json
 import os
-import random
+import queue
+import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
 from typing import Any, Dict, Optional
 
+# Use expandable segments so variable-resolution requests don't fragment the
+# CUDA caching allocator (requires PyTorch >= 2.1). Must be set before torch
+# initializes CUDA; an externally provided value takes precedence.
+os.environ.setdefault(
+    "PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:512"
+)
+
 import boto3
+import orjson
 import runpod
 import torch
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 from diffusers import BriaFiboPipeline
 from huggingface_hub import login
@@ -33,6 +46,26 @@ ASPECT_RATIOS = {
     "2:3": (832, 1216),
 }
 
+# Standard resolutions sorted by width/height ratio, for nearest-ratio lookup
+_RATIO_FLOATS = sorted((w / h, (w, h)) for w, h in ASPECT_RATIOS.values())
+_RATIO_KEYS = [ratio for ratio, _ in _RATIO_FLOATS]
+
+# Output encoding: format -> (PIL format, content type, extension, save options).
+# WebP/JPEG encode much faster and upload much smaller than PNG; PNG uses fast zlib.
+IMAGE_FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp", {"quality": 90, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", "jpg", {"quality": 92, "optimize": False}),
+    "png": ("PNG", "image/png", "png", {"compress_level": 1}),
+}
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "webp").lower()
+if OUTPUT_FORMAT not in IMAGE_FORMATS:
+    print(f"⚠ Unknown OUTPUT_FORMAT '{OUTPUT_FORMAT}', falling back to png")
+    OUTPUT_FORMAT = "png"
+
+
+# Per-request GPU memory logging is off by default to keep it out of the hot path
+DEBUG_MEM = os.getenv("DEBUG_MEM", "0") == "1"
+
 
 # GPU Memory Management Utilities
 def get_gpu_memory_info():
@@ -47,16 +80,21 @@ def get_gpu_memory_info():
     }
 
 
-def clear_gpu_memory():
-    """Aggressively clear GPU memory."""
+def clear_gpu_memory(collect: bool = False):
+    """Release cached GPU memory, running a full Python GC first if `collect`.
+    
+    Only meant for error paths; a full GC walks the whole heap.
+    """
+    if collect:
+        gc.collect()
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
-        torch.cuda.ipc_collect()
-    gc.collect()
 
 
-def log_memory_usage(stage: str):
-    """Log current GPU memory usage."""
+def log_memory_usage(stage: str, always: bool = False):
+    """Log current GPU memory usage (only with DEBUG_MEM=1 unless `always`)."""
+    if not (DEBUG_MEM or always):
+        return
     memory_info = get_gpu_memory_info()
     if memory_info:
         print(f"[{stage}] GPU Memory: "
@@ -65,6 +103,7 @@ def log_memory_usage(stage: str):
               f"Peak={memory_info['max_allocated_gb']:.2f}GB")
 
 
+@functools.lru_cache(maxsize=64)
 def parse_resolution(aspect_ratio: Optional[str] = None) -> tuple[int, int]:
     """Parse aspect ratio or return default resolution."""
     if not aspect_ratio:
@@ -79,41 +118,140 @@ def parse_resolution(aspect_ratio: Optional[str] = None) -> tuple[int, int]:
     if len(parts) == 2:
         try:
             width, height = int(parts[0].strip()), int(parts[1].strip())
-            # Find closest standard resolution
-            for ratio, (w, h) in ASPECT_RATIOS.items():
-                if abs(width / height - w / h) < 0.1:
-                    return (w, h)
-        except ValueError:
+            # Find closest standard resolution (neighbors of the insertion point)
+            target = width / height
+            idx = bisect.bisect_left(_RATIO_KEYS, target)
+            candidates = _RATIO_FLOATS[max(idx - 1, 0):idx + 1]
+            ratio, resolution = min(candidates, key=lambda c: abs(c[0] - target))
+            if abs(ratio - target) < 0.1:
+                return resolution
+        except (ValueError, ZeroDivisionError):
             pass
     
     # Default to 1:1
     return ASPECT_RATIOS["1:1"]
 
 
+# Shared R2 client, created lazily on first upload
+_R2_CLIENT = None
+_R2_CLIENT_LOCK = threading.Lock()
+
+# Large PNGs upload as threaded multipart; R2/S3 require parts of at least 5 MiB
+R2_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=5 * 1024 * 1024,
+    multipart_chunksize=5 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True,
+)
+
+# Maximum variants generated in one batched pipeline call (bounded by VRAM)
+MAX_BATCH = max(1, int(os.getenv("MAX_BATCH", "4")))
+
+# Text lengths (in tokens) prompt embeddings are padded up to when the denoiser is
+# compiled. FIBO only pads to the longest prompt in the call, so without buckets every
+# new prompt length is a new static shape (a recompile and a new CUDA graph).
+PROMPT_TOKEN_BUCKETS = (512, 1024, 2048, 3000)
+
+# Background pool so PNG encode + upload overlap with the next variant's generation
+UPLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="r2-upload")
+
+# Pinned HWC host buffers for GPU -> CPU image copies, one pool per (width, height)
+# filled at startup. A full batch can be staged without waiting on upload threads.
+STAGING_BUFFERS: Dict[tuple[int, int], "queue.Queue[torch.Tensor]"] = {}
+NUM_STAGING_BUFFERS = MAX_BATCH
+# Seconds to wait for a free staging buffer before failing the request
+STAGING_TIMEOUT = 60
+
+
+def get_r2_client():
+    """Get the shared R2 S3 client, creating it on first use."""
+    global _R2_CLIENT
+    if _R2_CLIENT is not None:
+        return _R2_CLIENT
+    
+    # Uploads run on worker threads, so guard the one-time construction
+    with _R2_CLIENT_LOCK:
+        if _R2_CLIENT is not None:
+            return _R2_CLIENT
+        
+        # Get R2 credentials from environment
+        r2_endpoint = os.getenv("R2_ENDPOINT_URL")
+        r2_access_key = os.getenv("R2_ACCESS_KEY_ID")
+        r2_secret_key = os.getenv("R2_SECRET_ACCESS_KEY")
+        r2_bucket = os.getenv("R2_BUCKET_NAME")
+        
+        if not all([r2_endpoint, r2_access_key, r2_secret_key, r2_bucket]):
+            raise ValueError("R2 credentials not configured. Please set R2_* environment variables.")
+        
+        # Create S3 client for R2 with a reusable connection pool
+        _R2_CLIENT = boto3.client(
+            "s3",
+            endpoint_url=r2_endpoint,
+            aws_access_key_id=r2_access_key,
+            aws_secret_access_key=r2_secret_key,
+            config=Config(
+                signature_version="s3v4",
+                max_pool_connections=16,
+                tcp_keepalive=True,
+                retries={"max_attempts": 3, "mode": "standard"},
+            ),
+        )
+    return _R2_CLIENT
+
+
+def allocate_staging_buffers():
+    """Pre-allocate pinned staging buffers for every supported resolution."""
+    for width, height in ASPECT_RATIOS.values():
+        pool = queue.Queue()
+        for _ in range(NUM_STAGING_BUFFERS):
+            pool.put(torch.empty((height, width, 3), dtype=torch.uint8, pin_memory=True))
+        STAGING_BUFFERS[(width, height)] = pool
+
+
+def stage_image(image_tensor: torch.Tensor) -> tuple[torch.Tensor, torch.cuda.Event]:
+    """Start a non-blocking copy of a CHW [0, 1] image tensor into a pinned buffer."""
+    _, height, width = image_tensor.shape
+    try:
+        buffer = STAGING_BUFFERS[(width, height)].get(timeout=STAGING_TIMEOUT)
+    except queue.Empty:
+        raise RuntimeError(f"Timed out waiting for a {width}x{height} staging buffer")
+    
+    # Quantize on the GPU so only uint8 HWC bytes cross PCIe; go through float32
+    # first since bf16 is too coarse to round to the same values as diffusers' PIL path
+    image_uint8 = image_tensor.float().mul(255).round_().to(torch.uint8).permute(1, 2, 0)
+    buffer.copy_(image_uint8, non_blocking=True)
+    
+    copied = torch.cuda.Event()
+    copied.record()
+    return buffer, copied
+
+
+def unstage_image(buffer: torch.Tensor, copied: torch.cuda.Event) -> Image.Image:
+    """Wait for a staged copy, convert it to PIL and release its buffer."""
+    try:
+        copied.synchronize()
+        return Image.fromarray(buffer.numpy())
+    finally:
+        height, width, _ = buffer.shape
+        STAGING_BUFFERS[(width, height)].put(buffer)
+
+
+def upload_staged_to_r2(staged_image: tuple, filename: str) -> str:
+    """Convert a staged image to PIL and upload it to R2 (runs on upload threads)."""
+    return upload_to_r2(unstage_image(*staged_image), filename)
+
+
 def upload_to_r2(image: Image.Image, filename: str) -> str:
     """Upload image to Cloudflare R2 and return public URL."""
-    # Get R2 credentials from environment
+    s3_client = get_r2_client()
     r2_endpoint = os.getenv("R2_ENDPOINT_URL")
-    r2_access_key = os.getenv("R2_ACCESS_KEY_ID")
-    r2_secret_key = os.getenv("R2_SECRET_ACCESS_KEY")
     r2_bucket = os.getenv("R2_BUCKET_NAME")
     r2_public_url = os.getenv("R2_PUBLIC_URL")  # e.g., https://yourdomain.r2.dev
     
-    if not all([r2_endpoint, r2_access_key, r2_secret_key, r2_bucket]):
-        raise ValueError("R2 credentials not configured. Please set R2_* environment variables.")
-    
-    # Create S3 client for R2
-    s3_client = boto3.client(
-        "s3",
-        endpoint_url=r2_endpoint,
-        aws_access_key_id=r2_access_key,
-        aws_secret_access_key=r2_secret_key,
-        config=Config(signature_version="s3v4"),
-    )
-    
     # Convert image to bytes
+    pil_format, content_type, _, save_options = IMAGE_FORMATS[OUTPUT_FORMAT]
     img_byte_arr = BytesIO()
-    image.save(img_byte_arr, format="PNG")
+    image.save(img_byte_arr, format=pil_format, **save_options)
     img_byte_arr.seek(0)
     
     # Upload to R2
@@ -121,7 +259,8 @@ def upload_to_r2(image: Image.Image, filename: str) -> str:
         img_byte_arr,
         r2_bucket,
         filename,
-        ExtraArgs={"ContentType": "image/png"},
+        ExtraArgs={"ContentType": content_type},
+        Config=R2_TRANSFER_CONFIG,
     )
     
     # Return public URL
@@ -131,6 +270,40 @@ def upload_to_r2(image: Image.Image, filename: str) -> str:
         return f"{r2_endpoint}/{r2_bucket}/{filename}"
 
 
+# Remembers the resolved snapshot so restarts can skip scanning the network volume
+MODEL_PATH_CACHE_FILE = Path("/tmp/fibo_model_path")
+
+
+def get_latest_snapshot(snapshots_dir: Path) -> Optional[Path]:
+    """Get the newest snapshot, reusing the cached result if the directory is unchanged."""
+    dir_mtime = snapshots_dir.stat().st_mtime
+    try:
+        cached = json.loads(MODEL_PATH_CACHE_FILE.read_text())
+        cached_path = Path(cached["path"])
+        if (cached["snapshots_dir"] == str(snapshots_dir)
+                and cached["mtime"] == dir_mtime
+                and cached_path.exists()):
+            return cached_path
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    
+    snapshots = list(snapshots_dir.iterdir())
+    if not snapshots:
+        return None
+    latest = max(snapshots, key=lambda p: p.stat().st_mtime)
+    
+    try:
+        MODEL_PATH_CACHE_FILE.write_text(json.dumps({
+            "snapshots_dir": str(snapshots_dir),
+            "mtime": dir_mtime,
+            "path": str(latest),
+        }))
+    except OSError as e:
+        print(f"⚠ Could not cache model path: {e}")
+    return latest
+
+
+@functools.lru_cache(maxsize=1)
 def get_model_path() -> str:
     """
     Get the model path, checking network volume first, then fallback to HF Hub.
@@ -160,9 +333,8 @@ def get_model_path() -> str:
                 snapshots_dir = path / "snapshots"
                 if snapshots_dir.exists():
                     # Get the latest snapshot
-                    snapshots = list(snapshots_dir.iterdir())
-                    if snapshots:
-                        latest = max(snapshots, key=lambda p: p.stat().st_mtime)
+                    latest = get_latest_snapshot(snapshots_dir)
+                    if latest:
                         print(f"✓ Using snapshot: {latest.name}")
                         return str(latest)
                 return str(path)
@@ -177,45 +349,84 @@ def get_model_path() -> str:
     return model_name
 
 
-def generate_image(
+def enable_prompt_buckets(pipeline):
+    """Pad the pipeline's prompt embeddings up to the next `PROMPT_TOKEN_BUCKETS` length.
+    
+    Padded tokens are masked out of attention, so images are unchanged.
+    """
+    encode_prompt = pipeline.encode_prompt
+    pad = pipeline.pad_embedding
+    
+    @functools.wraps(encode_prompt)
+    def encode_prompt_bucketed(*args, **kwargs):
+        (prompt_embeds, negative_prompt_embeds, text_ids, prompt_attention_mask,
+         negative_prompt_attention_mask, prompt_layers, negative_prompt_layers) = encode_prompt(*args, **kwargs)
+        
+        num_tokens = prompt_embeds.shape[1]
+        bucket = next((b for b in PROMPT_TOKEN_BUCKETS if b >= num_tokens), num_tokens)
+        if bucket > num_tokens:
+            prompt_embeds, prompt_attention_mask = pad(
+                prompt_embeds, bucket, attention_mask=prompt_attention_mask
+            )
+            prompt_layers = [pad(layer, bucket)[0] for layer in prompt_layers]
+            if negative_prompt_embeds is not None:
+                negative_prompt_embeds, negative_prompt_attention_mask = pad(
+                    negative_prompt_embeds, bucket, attention_mask=negative_prompt_attention_mask
+                )
+                negative_prompt_layers = [pad(layer, bucket)[0] for layer in negative_prompt_layers]
+            text_ids = text_ids.new_zeros(text_ids.shape[0], bucket, text_ids.shape[2])
+        
+        return (prompt_embeds, negative_prompt_embeds, text_ids, prompt_attention_mask,
+                negative_prompt_attention_mask, prompt_layers, negative_prompt_layers)
+    
+    pipeline.encode_prompt = encode_prompt_bucketed
+
+
+def generate_images(
     pipeline,
     json_prompt: str,
-    seed: int,
+    seeds: list[int],
     steps: int,
     aspect_ratio: Optional[str],
     guidance_scale: float,
     negative_prompt: str = "",
-) -> Image.Image:
-    """Generate a single image with FIBO."""
+) -> list[torch.Tensor]:
+    """Generate one image per seed with FIBO in a single batched pipeline call.
+    
+    Returns CHW image tensors on the GPU, ready for `stage_image`.
+    """
     # Parse resolution
     width, height = parse_resolution(aspect_ratio)
     
     # Convert dict to JSON string if needed
     if isinstance(json_prompt, dict):
-        json_prompt = json.dumps(json_prompt)
+        json_prompt = orjson.dumps(json_prompt).decode()
     
-    # Set seed for reproducibility
-    generator = None
-    if seed >= 0:
-        generator = torch.Generator(device="cuda").manual_seed(seed)
+    # Set seeds for reproducibility, reseeding the shared generators in place
+    generators = [
+        generator.manual_seed(int(seed))
+        for generator, seed in zip(GENERATORS, seeds)
+    ]
     
-    # Generate image with torch.no_grad() to prevent gradient accumulation
-    with torch.no_grad():
+    # Generate images under torch.inference_mode() (no autograd tracking at all)
+    with torch.inference_mode():
         result = pipeline(
             prompt=json_prompt,
+            num_images_per_prompt=len(seeds),
             num_inference_steps=steps,
             negative_prompt=negative_prompt,
-            generator=generator,
+            generator=generators,
             width=width,
             height=height,
             guidance_scale=guidance_scale,
+            output_type="pt",
         )
     
-    # Get the image and immediately delete the result object
-    image = result.images[0]
+    # Keep the image tensors and immediately delete the result object
+    images = list(result.images)
     del result
     
-    return image
+    return images
 
 
 def handler(job):
@@ -245,54 +456,78 @@ def handler(job):
         if steps < 1 or steps > 100:
             return {"error": "steps must be between 1 and 100"}
         
+        # Use provided seed (offset per variant) or a random seed for each variant
+        if seed >= 0:
+            seeds = [seed + i for i in range(variants)]
+        else:
+            seed_bytes = os.urandom(4 * variants)
+            seeds = [
+                int.from_bytes(seed_bytes[i * 4:(i + 1) * 4], "little")
+                for i in range(variants)
+            ]
+        
         # Generate images
-        results = []
+        uploads = []
         start_time = time.perf_counter()
+        generation_args = {
+            "pipeline": PIPELINE,
+            "json_prompt": json_prompt,
+            "steps": steps,
+            "aspect_ratio": aspect_ratio,
+            "guidance_scale": guidance_scale,
+            "negative_prompt": negative_prompt,
+        }
         
-        for i in range(variants):
-            # Use provided seed or generate random seed for each variant
-            variant_seed = seed if seed >= 0 else random.randint(0, 2**32 - 1)
-            if variants > 1 and seed >= 0:
-                # Add offset for multiple variants with fixed seed
-                variant_seed = seed + i
-            
-            print(f"Generating variant {i+1}/{variants} with seed {variant_seed}")
-            log_memory_usage(f"Before generation {i+1}")
+        # Batch variants (up to MAX_BATCH per call) so weights are read once per step
+        for batch_start in range(0, variants, MAX_BATCH):
+            batch_seeds = seeds[batch_start:batch_start + MAX_BATCH]
+            print(f"Generating variants {batch_start + 1}-{batch_start + len(batch_seeds)}"
+                  f"/{variants} with seeds {batch_seeds}")
             
-            # Generate image
-            image = generate_image(
-                pipeline=PIPELINE,
-                json_prompt=json_prompt,
-                seed=variant_seed,
-                steps=steps,
-                aspect_ratio=aspect_ratio,
-                guidance_scale=guidance_scale,
-                negative_prompt=negative_prompt,
-            )
+            fallback = False
+            try:
+                images = generate_images(seeds=batch_seeds, **generation_args)
+            except torch.cuda.OutOfMemoryError:
+                if len(batch_seeds) == 1:
+                    raise
+                fallback = True
             
-            # Upload to R2 immediately and release image memory
-            filename = f"fibo-{uuid.uuid4()}.png"
-            url = upload_to_r2(image, filename)
+            # Retry outside the except block so the failed call's traceback (and the
+            # activations its frames hold) is released before cleaning up
+            if fallback:
+                print(f"⚠ Out of memory for batch of {len(batch_seeds)}, "
+                      f"falling back to one variant at a time")
+                clear_gpu_memory(collect=True)
+                images = [
+                    image
+                    for variant_seed in batch_seeds
+                    for image in generate_images(seeds=[variant_seed], **generation_args)
+                ]
             
+            for image, variant_seed in zip(images, batch_seeds):
+                # Copy to pinned memory without syncing, then convert, encode and
+                # upload in the background while the next batch generates
+                staged_image = stage_image(image)
+                filename = f"fibo-{uuid.uuid4()}.{IMAGE_FORMATS[OUTPUT_FORMAT][2]}"
+                future = UPLOAD_EXECUTOR.submit(upload_staged_to_r2, staged_image, filename)
+                uploads.append((future, variant_seed, filename))
+            del images
+        
+        # Wait for all uploads, keeping results in variant order
+        results = []
+        for future, variant_seed, filename in uploads:
+            url = future.result()
             results.append({
                 "url": url,
                 "seed": variant_seed,
                 "filename": filename,
             })
-            
-            # Explicitly delete the image to free memory
-            del image
-            
-            # Clear GPU cache after each generation
-            clear_gpu_memory()
-            log_memory_usage(f"After generation {i+1}")
-            
             print(f"Generated and uploaded: {url}")
         
         elapsed = time.perf_counter() - start_time
         
-        # Final memory cleanup
-        clear_gpu_memory()
+        # No cache flush here: variants share the same shapes, so the caching
+        # allocator can reuse its blocks for the next request
         log_memory_usage("End of request")
         
         return {
@@ -311,7 +546,7 @@ def handler(job):
         import traceback
         traceback.print_exc()
         # Clean up on error
-        clear_gpu_memory()
+        clear_gpu_memory(collect=True)
         return {"error": str(e)}
 
 
@@ -321,6 +556,7 @@ print("FIBO Worker Initialization")
 print("=" * 60)
 
 PIPELINE = None
+GENERATORS = []
 
 try:
     # Login to Hugging Face if token is provided (required for gated models)
@@ -336,6 +572,9 @@ try:
     assert torch.cuda.is_available(), "CUDA not available"
     print(f"✓ CUDA available: {torch.cuda.get_device_name(0)}")
     
+    # CUDA generators reused (and reseeded) for every image, one per batch slot
+    GENERATORS = [torch.Generator(device="cuda") for _ in range(MAX_BATCH)]
+    
     # Get model path (network volume or HF Hub)
     model_path = get_model_path()
     
@@ -351,6 +590,10 @@ try:
     load_time = time.perf_counter() - load_start
     print(f"✓ FIBO pipeline loaded in {load_time:.2f}s")
     
+    # Allocate pinned staging buffers up front instead of per request
+    allocate_staging_buffers()
+    print(f"✓ Allocated pinned staging buffers for {len(STAGING_BUFFERS)} resolutions")
+    
     # MEMORY OPTIMIZATION: Try to enable VAE tiling if available
     # Note: BriaFiboPipeline may not support all standard diffusers optimizations
     if hasattr(PIPELINE, 'enable_vae_tiling'):
@@ -378,14 +621,101 @@ try:
         print(f"✓ Enabling TeaCache with threshold={teacache_threshold}")
         PIPELINE.enable_teacache(num_inference_steps=50, rel_l1_thresh=teacache_threshold)
     
+    # Quantize weights if configured (fp8 for Ada/Hopper, int8 for older GPUs)
+    quantize = os.getenv("QUANTIZE", "none").lower()
+    if quantize in ("fp8", "int8"):
+        try:
+            from torchao.quantization import (
+                Float8WeightOnlyConfig,
+                Int8WeightOnlyConfig,
+                quantize_,
+            )
+            
+            denoiser_name = "transformer" if hasattr(PIPELINE, "transformer") else "unet"
+            denoiser_config = Float8WeightOnlyConfig() if quantize == "fp8" else Int8WeightOnlyConfig()
+            print(f"✓ Quantizing {denoiser_name} weights to {quantize}")
+            quantize_(getattr(PIPELINE, denoiser_name), denoiser_config)
+            
+            # Text encoders run once per prompt, so favor quality with int8
+            for name in ("text_encoder", "text_encoder_2"):
+                if getattr(PIPELINE, name, None) is not None:
+                    print(f"✓ Quantizing {name} weights to int8")
+                    quantize_(getattr(PIPELINE, name), Int8WeightOnlyConfig())
+        except ImportError:
+            print(f"⚠ torchao not installed - skipping quantization")
+    elif quantize != "none":
+        print(f"⚠ Unknown QUANTIZE '{quantize}', expected none, fp8 or int8")
+    
     # Enable CPU offload if configured (aggressive memory saving)
     enable_cpu_offload = os.getenv("ENABLE_CPU_OFFLOAD", "false").lower() == "true"
     if enable_cpu_offload:
         print(f"✓ Enabling CPU offload (aggressive VRAM reduction, slower inference)")
         PIPELINE.enable_model_cpu_offload()
     
+    # Compile the denoiser if configured (incompatible with CPU offload)
+    enable_compile = os.getenv("ENABLE_TORCH_COMPILE", "false").lower() == "true"
+    if enable_compile and enable_cpu_offload:
+        print(f"⚠ Skipping torch.compile: not compatible with CPU offload")
+    elif enable_compile:
+        # FIBO is a DiT, so the denoiser is `transformer`; fall back to `unet`
+        denoiser_name = "transformer" if hasattr(PIPELINE, "transformer") else "unet"
+        print(f"✓ Compiling {denoiser_name} with torch.compile (mode=reduce-overhead)")
+        # Static shapes vary with resolution, batch size (doubled by CFG) and prompt
+        # bucket; keep every combination under the recompile limits
+        enable_prompt_buckets(PIPELINE)
+        num_shapes = len(ASPECT_RATIOS) * 2 * MAX_BATCH * len(PROMPT_TOKEN_BUCKETS)
+        torch._dynamo.config.cache_size_limit = max(
+            torch._dynamo.config.cache_size_limit, num_shapes
+        )
+        torch._dynamo.config.accumulated_cache_size_limit = max(
+            torch._dynamo.config.accumulated_cache_size_limit, num_shapes
+        )
+        setattr(PIPELINE, denoiser_name, torch.compile(
+            getattr(PIPELINE, denoiser_name),
+            mode="reduce-overhead",
+            fullgraph=False,
+            dynamic=False,
+        ))
+        
+        # Trigger compilation and CUDA graph capture now so requests don't pay for
+        # it. Shapes are static, so each resolution, batch size (1..MAX_BATCH) and
+        # prompt bucket gets its own graph; COMPILE_WARMUP lists the aspect ratios to
+        # capture up front ("all" for every supported one). Warmups use the default
+        # guidance scale, so requests with guidance_scale <= 1 compile on first use.
+        warmup_ratios = os.getenv("COMPILE_WARMUP", "1:1")
+        if warmup_ratios.strip().lower() == "all":
+            warmup_ratios = ",".join(ASPECT_RATIOS)
+        for ratio in filter(None, (r.strip() for r in warmup_ratios.split(","))):
+            width, height = parse_resolution(ratio)
+            for bucket in PROMPT_TOKEN_BUCKETS:
+                # About one token per word, so the prompt lands in this bucket
+                warmup_prompt = orjson.dumps(
+                    {"short_description": "warmup" + " a" * (bucket - 64)}
+                ).decode()
+                for batch_size in range(1, MAX_BATCH + 1):
+                    try:
+                        warmup_start = time.perf_counter()
+                        with torch.inference_mode():
+                            PIPELINE(
+                                prompt=warmup_prompt,
+                                num_images_per_prompt=batch_size,
+                                num_inference_steps=2,
+                                width=width,
+                                height=height,
+                                output_type="pt",
+                            )
+                        print(f"✓ Compile warmup for {width}x{height} (batch {batch_size}, "
+                              f"{bucket} tokens) finished in {time.perf_counter() - warmup_start:.2f}s")
+                    except Exception as e:
+                        print(f"⚠ Compile warmup for {width}x{height} (batch {batch_size}, "
+                              f"{bucket} tokens) failed, compiling on first request instead: {e}")
+    
     # Log initial memory usage
-    log_memory_usage("Model loaded")
+    log_memory_usage("Model loaded", always=True)
+    
+    # Move long-lived pipeline objects out of GC tracking so later collections stay cheap
+    gc.collect()
+    gc.freeze()
     
     print("=" * 60)
     print("✓ Worker ready to process requests")
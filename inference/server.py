@@ -8,22 +8,35 @@ Usage:
 Then visit: http://localhost:8000/docs
 """
 
+import asyncio
+import base64
+import concurrent.futures
+import functools
 import gc
 import io
-import json
 import os
+import random
+import threading
 import time
 import uuid
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional, get_args
 
+# Keep the CUDA caching allocator warm across requests instead of flushing it, and
+# use expandable segments to avoid fragmentation across resolutions (PyTorch >= 2.1).
+# Must be set before torch initializes CUDA; a launcher-provided value takes precedence.
+os.environ.setdefault(
+    "PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:512"
+)
+
+import orjson
 import torch
 import uvicorn
 from diffusers import BriaFiboPipeline
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse
 from PIL import Image
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -47,10 +60,51 @@ ASPECT_RATIOS = {
     "2:3": (832, 1216),
 }
 
+# Supported aspect ratios, validated by pydantic before reaching the handler
+AspectRatio = Literal[
+    "1:1", "16:9", "9:16", "4:3", "3:4", "21:9", "9:21", "5:4", "4:5", "3:2", "2:3"
+]
+assert set(get_args(AspectRatio)) == set(ASPECT_RATIOS), "AspectRatio is out of sync with ASPECT_RATIOS"
+
+# Output encoding: format -> (PIL format, content type, extension, save options).
+# PNG uses fast zlib; JPEG/WebP skip zlib entirely.
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png", "png", {"compress_level": 1}),
+    "jpeg": ("JPEG", "image/jpeg", "jpg", {"quality": 92}),
+    "webp": ("WEBP", "image/webp", "webp", {"quality": 92}),
+}
+
+# Per-request GPU memory logging (startup logging always runs)
+_DEBUG_MEM = os.getenv("FIBO_DEBUG_MEM", "0") == "1"
+
 # Global pipeline instance
 PIPELINE = None
+# Maximum variants generated in one batched pipeline call (bounded by VRAM)
+MAX_BATCH = max(1, int(os.getenv("FIBO_MAX_BATCH", "4")))
+# Text lengths (in tokens) prompt embeddings are padded up to with FIBO_COMPILE=1, so
+# prompts of different lengths reuse the same compiled graphs
+PROMPT_TOKEN_BUCKETS = (512, 1024, 2048, 3000)
 OUTPUT_DIR = Path("./outputs")
 OUTPUT_DIR.mkdir(exist_ok=True)
+OUTPUT_DIR_STR = str(OUTPUT_DIR)
+
+# Generators reused across images, keyed by (device, batch slot, thread) so
+# concurrent requests never reseed each other's generators
+_GEN_CACHE: Dict[tuple[str, int, int], torch.Generator] = {}
+
+# Dedicated threads for every pipeline call, warmups included. CUDA graph trees from
+# torch.compile are per-thread, so graphs captured at startup are only reused when
+# requests run on the same small, fixed set of threads.
+MAX_CONCURRENT = max(1, int(os.getenv("FIBO_MAX_CONCURRENT", "1")))
+_PIPELINE_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=MAX_CONCURRENT, thread_name_prefix="fibo-pipeline"
+)
+
+# Worker threads that save/encode images while the next batch generates
+_SAVE_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="fibo-save")
+
+# Limits how many requests run the pipeline at once; others queue instead of OOMing
+_GEN_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT)
 
 
 # GPU Memory Management Utilities
@@ -67,10 +121,10 @@ def get_gpu_memory_info():
 
 
 def clear_gpu_memory():
-    """Aggressively clear GPU memory."""
-    if torch.cuda.is_available():
-        torch.cuda.empty_cache()
-        torch.cuda.ipc_collect()
+    """Drop unreachable Python objects holding GPU tensors (error paths only).
+    
+    The allocator cache is deliberately kept so later requests can reuse it.
+    """
     gc.collect()
 
 
@@ -86,17 +140,24 @@ def log_memory_usage(stage: str):
 
 # Request/Response Models
 class GenerateRequest(BaseModel):
-    json_prompt: Dict[str, Any] = Field(..., description="FIBO structured prompt")
+    json_prompt: Optional[Dict[str, Any]] = Field(None, description="FIBO structured prompt")
+    json_prompt_str: Optional[str] = Field(
+        None, description="FIBO structured prompt as a pre-serialized JSON string (skips re-serialization)"
+    )
     seed: int = Field(-1, description="Random seed, -1 for random")
     steps: int = Field(50, ge=1, le=100, description="Number of inference steps")
     variants: int = Field(1, ge=1, le=10, description="Number of images to generate")
-    aspect_ratio: str = Field("1:1", description="Aspect ratio (e.g., '16:9', '1:1')")
+    aspect_ratio: AspectRatio = Field("1:1", description="Aspect ratio (e.g., '16:9', '1:1')")
     guidance_scale: float = Field(5.0, description="Classifier-free guidance scale")
     negative_prompt: str = Field("", description="Negative prompt (optional)")
     return_base64: bool = Field(False, description="Return base64 encoded images instead of files")
+    output_format: Literal["png", "jpeg", "webp"] = Field("png", description="Image encoding format")
 
-    class Config:
-        json_schema_extra = {
+    # defer_build=False is pydantic v2's default; set explicitly so it stays eager
+    model_config = ConfigDict(
+        defer_build=False,
+        frozen=True,
+        json_schema_extra={
             "example": {
                 "json_prompt": {
                     "short_description": "A serene mountain landscape at sunset",
@@ -112,7 +173,16 @@ class GenerateRequest(BaseModel):
                 "aspect_ratio": "16:9",
                 "guidance_scale": 5.0,
             }
-        }
+        },
+    )
+
+    @model_validator(mode="after")
+    def check_prompt(self) -> "GenerateRequest":
+        if self.json_prompt is None and self.json_prompt_str is None:
+            raise ValueError("Either json_prompt or json_prompt_str is required")
+        if self.json_prompt is not None and self.json_prompt_str is not None:
+            raise ValueError("Provide only one of json_prompt or json_prompt_str")
+        return self
 
 
 class ImageResult(BaseModel):
@@ -129,71 +199,137 @@ class GenerateResponse(BaseModel):
 
 
 # Helper functions
-def parse_resolution(aspect_ratio: Optional[str] = None) -> tuple[int, int]:
-    """Parse aspect ratio or return default resolution."""
-    if not aspect_ratio:
-        return ASPECT_RATIOS["1:1"]
+def parse_resolution(aspect_ratio: AspectRatio) -> tuple[int, int]:
+    """Look up the resolution for an aspect ratio already validated by pydantic."""
+    return ASPECT_RATIOS[aspect_ratio]
+
+
+def get_generator(device: str, seed: int, index: int = 0) -> torch.Generator:
+    """Get the cached generator for a device and batch slot, reseeded in place."""
+    key = (device, index, threading.get_ident())
+    generator = _GEN_CACHE.get(key)
+    if generator is None:
+        generator = _GEN_CACHE[key] = torch.Generator(device=device)
+    return generator.manual_seed(seed)
+
+
+def enable_prompt_buckets(pipeline):
+    """Pad the pipeline's prompt embeddings up to the next `PROMPT_TOKEN_BUCKETS` length.
     
-    aspect_ratio = aspect_ratio.strip()
-    if aspect_ratio in ASPECT_RATIOS:
-        return ASPECT_RATIOS[aspect_ratio]
+    Padded tokens are masked out of attention, so images are unchanged.
+    """
+    encode_prompt = pipeline.encode_prompt
+    pad = pipeline.pad_embedding
     
-    # Try to parse as "width:height"
-    parts = aspect_ratio.replace("x", ":").split(":")
-    if len(parts) == 2:
-        try:
-            width, height = int(parts[0].strip()), int(parts[1].strip())
-            # Find closest standard resolution
-            for ratio, (w, h) in ASPECT_RATIOS.items():
-                if abs(width / height - w / h) < 0.1:
-                    return (w, h)
-        except ValueError:
-            pass
+    @functools.wraps(encode_prompt)
+    def encode_prompt_bucketed(*args, **kwargs):
+        (prompt_embeds, negative_prompt_embeds, text_ids, prompt_attention_mask,
+         negative_prompt_attention_mask, prompt_layers, negative_prompt_layers) = encode_prompt(*args, **kwargs)
+        
+        num_tokens = prompt_embeds.shape[1]
+        bucket = next((b for b in PROMPT_TOKEN_BUCKETS if b >= num_tokens), num_tokens)
+        if bucket > num_tokens:
+            prompt_embeds, prompt_attention_mask = pad(
+                prompt_embeds, bucket, attention_mask=prompt_attention_mask
+            )
+            prompt_layers = [pad(layer, bucket)[0] for layer in prompt_layers]
+            if negative_prompt_embeds is not None:
+                negative_prompt_embeds, negative_prompt_attention_mask = pad(
+                    negative_prompt_embeds, bucket, attention_mask=negative_prompt_attention_mask
+                )
+                negative_prompt_layers = [pad(layer, bucket)[0] for layer in negative_prompt_layers]
+            text_ids = text_ids.new_zeros(text_ids.shape[0], bucket, text_ids.shape[2])
+        
+        return (prompt_embeds, negative_prompt_embeds, text_ids, prompt_attention_mask,
+                negative_prompt_attention_mask, prompt_layers, negative_prompt_layers)
     
-    # Default to 1:1
-    return ASPECT_RATIOS["1:1"]
+    pipeline.encode_prompt = encode_prompt_bucketed
 
 
-def generate_image(
-    json_prompt: Dict[str, Any],
-    seed: int,
+def generate_images(
+    json_prompt: str,
+    seeds: List[int],
     steps: int,
-    aspect_ratio: Optional[str],
+    aspect_ratio: AspectRatio,
     guidance_scale: float,
     negative_prompt: str = "",
-) -> Image.Image:
-    """Generate a single image with FIBO."""
+) -> List[Image.Image]:
+    """Generate one image per seed with FIBO in a single batched pipeline call.
+    
+    `json_prompt` is the already-serialized FIBO JSON prompt.
+    """
     # Parse resolution
     width, height = parse_resolution(aspect_ratio)
     
-    # Convert dict to JSON string
-    if isinstance(json_prompt, dict):
-        json_prompt_str = json.dumps(json_prompt)
-    else:
-        json_prompt_str = json_prompt
-    
-    # Set seed for reproducibility
-    generator = None
-    if seed >= 0:
-        generator = torch.Generator(device="cuda" if torch.cuda.is_available() else "cpu").manual_seed(seed)
+    # Set seeds for reproducibility, one generator per image in the batch
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    generators = [get_generator(device, seed, index) for index, seed in enumerate(seeds)]
     
-    # Generate image with torch.no_grad() to prevent gradient accumulation
-    with torch.no_grad():
+    # Generate images under torch.inference_mode() (no autograd tracking at all).
+    # No autocast: the weights are already bf16, and ops the pipeline deliberately
+    # keeps in fp32 should stay there.
+    with torch.inference_mode():
         result = PIPELINE(
-            prompt=json_prompt_str,
+            prompt=json_prompt,
+            num_images_per_prompt=len(seeds),
             num_inference_steps=steps,
             negative_prompt=negative_prompt,
-            generator=generator,
+            generator=generators,
             width=width,
             height=height,
             guidance_scale=guidance_scale,
         )
     
-    # Get the image and immediately delete the result object
-    image = result.images[0]
+    # Get the images and immediately delete the result object
+    images = result.images
     del result
     
-    return image
+    return images
+
+
+def _save_or_encode(
+    image: Image.Image,
+    filename: str,
+    seed: int,
+    return_base64: bool,
+    output_format: str = "png",
+) -> Dict[str, Any]:
+    """Save an image to disk or encode it as base64 (CPU-bound, run off the event loop)."""
+    pil_format, _, _, save_options = IMAGE_FORMATS[output_format]
+    if return_base64:
+        # Convert to base64
+        buffer = io.BytesIO()
+        image.save(buffer, format=pil_format, **save_options)
+        # Encode straight from the BytesIO buffer without copying it out first
+        with buffer.getbuffer() as view:
+            base64_str = base64.b64encode(view).decode("ascii")
+        buffer.close()
+        result = {
+            "filename": filename,
+            "seed": seed,
+            "base64": base64_str,
+        }
+    else:
+        # Save to disk
+        output_path = os.path.join(OUTPUT_DIR_STR, filename)
+        with open(output_path, "wb", buffering=4 * 1024 * 1024) as f:
+            image.save(f, format=pil_format, **save_options)
+        result = {
+            "filename": filename,
+            "seed": seed,
+            "path": output_path,
+        }
+    
+    print(f"Generated: {filename}")
+    return result
+
+
+async def run_generate_images(**kwargs) -> List[Image.Image]:
+    """Run `generate_images` on the pipeline thread pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _PIPELINE_POOL, functools.partial(generate_images, **kwargs)
+    )
 
 
 # API Endpoints
@@ -255,7 +391,8 @@ async def generate(request: GenerateRequest):
     
     try:
         # Log initial memory state
-        log_memory_usage("Start of request")
+        if _DEBUG_MEM:
+            log_memory_usage("Start of request")
         
         # Validate inputs
         if request.variants < 1 or request.variants > 10:
@@ -265,78 +402,65 @@ async def generate(request: GenerateRequest):
             raise HTTPException(status_code=400, detail="steps must be between 1 and 100")
         
         # Generate images
-        results = []
+        save_futures = []
         start_time = time.perf_counter()
         
-        for i in range(request.variants):
-            # Use provided seed or generate random seed for each variant
-            import random
-            variant_seed = request.seed if request.seed >= 0 else random.randint(0, 2**32 - 1)
-            if request.variants > 1 and request.seed >= 0:
-                variant_seed = request.seed + i
-            
-            # Set seed for reproducibility
-            if variant_seed >= 0:
-                random.seed(variant_seed)
-                torch.manual_seed(variant_seed)
-                if torch.cuda.is_available():
-                    torch.cuda.manual_seed_all(variant_seed)
-            
-            print(f"Generating variant {i+1}/{request.variants} with seed {variant_seed}")
-            log_memory_usage(f"Before generation {i+1}")
-            
-            # Generate image
-            image = generate_image(
-                json_prompt=request.json_prompt,
-                seed=variant_seed,
-                steps=request.steps,
-                aspect_ratio=request.aspect_ratio,
-                guidance_scale=request.guidance_scale,
-                negative_prompt=request.negative_prompt,
-            )
-            
-            # Save or encode image immediately to release memory
-            filename = f"fibo-{uuid.uuid4()}.png"
-            
-            if request.return_base64:
-                # Convert to base64
-                import base64
-                buffer = io.BytesIO()
-                image.save(buffer, format="PNG")
-                buffer.seek(0)
-                base64_str = base64.b64encode(buffer.read()).decode()
-                buffer.close()
-                
-                results.append({
-                    "filename": filename,
-                    "seed": variant_seed,
-                    "base64": base64_str,
-                })
-            else:
-                # Save to disk
-                output_path = OUTPUT_DIR / filename
-                image.save(output_path)
-                
-                results.append({
-                    "filename": filename,
-                    "seed": variant_seed,
-                    "path": str(output_path),
-                })
+        # Serialize the prompt once per request exactly like the RunPod handler (compact,
+        # raw UTF-8) so both give the same tokens, or use the client's string as-is
+        if request.json_prompt_str is not None:
+            json_prompt_str = request.json_prompt_str
+        else:
+            json_prompt_str = orjson.dumps(request.json_prompt).decode()
+        
+        # Use provided seed (offset per variant) or a random seed for each variant
+        if request.seed >= 0:
+            seeds = [request.seed + i for i in range(request.variants)]
+        else:
+            seeds = [random.randint(0, 2**32 - 1) for _ in range(request.variants)]
+        
+        # Generate variants in batches of up to MAX_BATCH per pipeline call
+        for batch_start in range(0, request.variants, MAX_BATCH):
+            batch_seeds = seeds[batch_start:batch_start + MAX_BATCH]
             
-            # Explicitly delete the image to free memory
-            del image
+            print(f"Generating variants {batch_start + 1}-{batch_start + len(batch_seeds)}"
+                  f"/{request.variants} with seeds {batch_seeds}")
+            if _DEBUG_MEM:
+                log_memory_usage(f"Before batch {batch_start // MAX_BATCH + 1}")
             
-            # Clear GPU cache after each generation
-            clear_gpu_memory()
-            log_memory_usage(f"After generation {i+1}")
+            # Generate images on a pipeline thread so the event loop stays responsive
+            async with _GEN_SEMAPHORE:
+                images = await run_generate_images(
+                    json_prompt=json_prompt_str,
+                    seeds=batch_seeds,
+                    steps=request.steps,
+                    aspect_ratio=request.aspect_ratio,
+                    guidance_scale=request.guidance_scale,
+                    negative_prompt=request.negative_prompt,
+                )
             
-            print(f"Generated: {filename}")
+            # Hand the batch to the save pool and move straight on to the next batch,
+            # so encoding overlaps with diffusion; the pool now owns the images
+            extension = IMAGE_FORMATS[request.output_format][2]
+            for image, variant_seed in zip(images, batch_seeds):
+                save_futures.append(_SAVE_POOL.submit(
+                    _save_or_encode,
+                    image,
+                    f"fibo-{uuid.uuid4()}.{extension}",
+                    variant_seed,
+                    request.return_base64,
+                    request.output_format,
+                ))
+            del images
+            if _DEBUG_MEM:
+                log_memory_usage(f"After batch {batch_start // MAX_BATCH + 1}")
+        
+        # Wait for all saves without blocking the event loop, keeping variant order
+        results = await asyncio.gather(*[asyncio.wrap_future(f) for f in save_futures])
         
         elapsed = time.perf_counter() - start_time
         
-        # Final memory cleanup
-        clear_gpu_memory()
-        log_memory_usage("End of request")
+        if _DEBUG_MEM:
+            log_memory_usage("End of request")
         
         return {
             "images": results,
@@ -366,12 +490,8 @@ async def get_image(filename: str):
     if not image_path.exists():
         raise HTTPException(status_code=404, detail="Image not found")
     
-    # Return image as streaming response
-    def iterfile():
-        with open(image_path, "rb") as f:
-            yield from f
-    
-    return StreamingResponse(iterfile(), media_type="image/png")
+    # Served with sendfile; media type is inferred from the extension (png/jpg/webp)
+    return FileResponse(image_path)
 
 
 # Startup event
@@ -412,12 +532,23 @@ async def startup_event():
         load_time = time.perf_counter() - load_start
         print(f"✓ Model loaded in {load_time:.2f}s")
         
+        # Use NHWC layout for the VAE's 2D conv weights so cuDNN can pick tensor-core
+        # kernels. FIBO's Wan VAE is mostly Conv3d, whose 5-D weights can't be
+        # channels_last, and the transformer has no convs, so only Conv2d is converted.
+        if device == "cuda":
+            conv2d_layers = [m for m in PIPELINE.vae.modules() if isinstance(m, torch.nn.Conv2d)]
+            print(f"✓ Converting {len(conv2d_layers)} VAE Conv2d layers to channels_last")
+            for module in conv2d_layers:
+                module.to(memory_format=torch.channels_last)
+        
         # MEMORY OPTIMIZATION: Try to enable VAE tiling if available
         # Note: BriaFiboPipeline may not support all standard diffusers optimizations
+        vae_tiling = False
         if device == "cuda" and hasattr(PIPELINE, 'enable_vae_tiling'):
             try:
                 print(f"✓ Enabling VAE tiling (reduces VRAM usage for high-res images)")
                 PIPELINE.enable_vae_tiling()
+                vae_tiling = True
             except Exception as e:
                 print(f"⚠ Could not enable VAE tiling: {e}")
         
@@ -439,11 +570,109 @@ async def startup_event():
             print(f"✓ Enabling TeaCache with threshold={teacache_threshold}")
             PIPELINE.enable_teacache(num_inference_steps=50, rel_l1_thresh=teacache_threshold)
         
+        # Compile the transformer if configured (CUDA only)
+        enable_compile = device == "cuda" and os.getenv("FIBO_COMPILE", "0") == "1"
+        
         # Enable CPU offload if configured (aggressive memory saving)
         enable_cpu_offload = os.getenv("ENABLE_CPU_OFFLOAD", "false").lower() == "true"
-        if enable_cpu_offload:
+        if enable_cpu_offload and enable_compile:
+            print(f"⚠ Skipping CPU offload: not compatible with FIBO_COMPILE")
+        elif enable_cpu_offload and device == "cuda":
             print(f"✓ Enabling CPU offload (aggressive VRAM reduction, slower inference)")
-            PIPELINE.enable_model_cpu_offload()
+            try:
+                # Group offloading keeps CPU weights in pinned memory and prefetches the
+                # next layer with non-blocking copies on a side stream, overlapping PCIe
+                # transfers with compute
+                from diffusers.hooks import apply_group_offloading
+                
+                PIPELINE.to("cpu")
+                for name, component in PIPELINE.components.items():
+                    if isinstance(component, torch.nn.Module):
+                        apply_group_offloading(
+                            component,
+                            onload_device=torch.device("cuda"),
+                            offload_device=torch.device("cpu"),
+                            offload_type="leaf_level",
+                            use_stream=True,
+                        )
+                print(f"✓ Using pinned-memory group offloading with stream prefetch")
+            except ImportError:
+                print(f"⚠ Group offloading unavailable, using model CPU offload")
+                PIPELINE.enable_model_cpu_offload()
+        
+        if enable_compile:
+            print(f"✓ Compiling transformer with torch.compile (mode=reduce-overhead)")
+            # Static shapes vary with resolution, batch size (doubled by CFG) and prompt
+            # bucket; keep every combination under the recompile limits
+            enable_prompt_buckets(PIPELINE)
+            num_shapes = len(ASPECT_RATIOS) * 2 * MAX_BATCH * len(PROMPT_TOKEN_BUCKETS)
+            torch._dynamo.config.cache_size_limit = max(
+                torch._dynamo.config.cache_size_limit, num_shapes
+            )
+            torch._dynamo.config.accumulated_cache_size_limit = max(
+                torch._dynamo.config.accumulated_cache_size_limit, num_shapes
+            )
+            PIPELINE.transformer = torch.compile(
+                PIPELINE.transformer, mode="reduce-overhead", fullgraph=False, dynamic=False
+            )
+            # Tiled decoding keeps earlier tile outputs alive across CUDA graph replays,
+            # which reduce-overhead would overwrite, so only compile the untiled decoder
+            if vae_tiling:
+                print(f"⚠ Not compiling VAE decoder: not compatible with VAE tiling")
+            elif hasattr(PIPELINE, "vae") and hasattr(PIPELINE.vae, "decoder"):
+                PIPELINE.vae.decoder = torch.compile(
+                    PIPELINE.vae.decoder, mode="reduce-overhead", fullgraph=False, dynamic=False
+                )
+            
+            # Capture a graph for every resolution, batch size (1..FIBO_MAX_BATCH) and
+            # prompt bucket before serving requests. FIBO_COMPILE_WARMUP narrows the
+            # aspect ratios ("all" by default) to shorten startup.
+            warmup_ratios = os.getenv("FIBO_COMPILE_WARMUP", "all")
+            if warmup_ratios.strip().lower() == "all":
+                warmup_ratios = ",".join(ASPECT_RATIOS)
+            for ratio in filter(None, (r.strip() for r in warmup_ratios.split(","))):
+                if ratio not in ASPECT_RATIOS:
+                    print(f"⚠ Unknown aspect ratio '{ratio}' in FIBO_COMPILE_WARMUP, skipping")
+                    continue
+                w, h = ASPECT_RATIOS[ratio]
+                for bucket in PROMPT_TOKEN_BUCKETS:
+                    # About one token per word, so the prompt lands in this bucket
+                    warmup_prompt = orjson.dumps(
+                        {"short_description": "warmup" + " a" * (bucket - 64)}
+                    ).decode()
+                    for batch_size in range(1, MAX_BATCH + 1):
+                        try:
+                            warmup_start = time.perf_counter()
+                            await run_generate_images(
+                                json_prompt=warmup_prompt,
+                                seeds=list(range(batch_size)),
+                                steps=2,
+                                aspect_ratio=ratio,
+                                guidance_scale=5.0,
+                            )
+                            print(f"✓ Compiled {ratio} ({w}x{h}, batch {batch_size}, {bucket} tokens) "
+                                  f"in {time.perf_counter() - warmup_start:.2f}s")
+                        except Exception as e:
+                            print(f"⚠ Compile warmup for {ratio} ({w}x{h}, batch {batch_size}, "
+                                  f"{bucket} tokens) failed, compiling on first request instead: {e}")
+        
+        # Run a short generation so the allocator pool and kernels are warm before the
+        # first request (the compile step above already warmed every resolution). Use the
+        # request default guidance scale: above 1, FIBO also encodes the negative prompt
+        # and doubles the batch, which is the working set real requests need.
+        if device == "cuda" and not enable_compile and os.getenv("FIBO_WARMUP", "1") == "1":
+            try:
+                warmup_start = time.perf_counter()
+                await run_generate_images(
+                    json_prompt=orjson.dumps({"short_description": "warmup"}).decode(),
+                    seeds=[0],
+                    steps=2,
+                    aspect_ratio="1:1",
+                    guidance_scale=5.0,
+                )
+                print(f"✓ Warmup finished in {time.perf_counter() - warmup_start:.2f}s")
+            except Exception as e:
+                print(f"⚠ Warmup failed: {e}")
         
         # Log initial memory usage
         log_memory_usage("Model loaded")
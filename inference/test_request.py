@@ -4,12 +4,16 @@ Quick test script to send a request to the local server.
 Usage:
     # Start server first: python server.py
     # Then run this: python test_request.py
+    # Load test with N concurrent requests: python test_request.py N
 """
 
+import asyncio
 import json
-import requests
+import sys
 import time
 
+import httpx
+
 # Server URL
 BASE_URL = "http://localhost:8000"
 
@@ -36,19 +40,19 @@ test_request = {
 }
 
 
-def test_health():
+async def test_health(client: httpx.AsyncClient):
     """Test health endpoint."""
     print("Testing health endpoint...")
-    response = requests.get(f"{BASE_URL}/health")
+    response = await client.get(f"{BASE_URL}/health")
     print(f"Status: {response.status_code}")
     print(f"Response: {json.dumps(response.json(), indent=2)}")
     print()
 
 
-def test_aspect_ratios():
+async def test_aspect_ratios(client: httpx.AsyncClient):
     """Test aspect ratios endpoint."""
     print("Testing aspect ratios endpoint...")
-    response = requests.get(f"{BASE_URL}/aspect-ratios")
+    response = await client.get(f"{BASE_URL}/aspect-ratios")
     print(f"Status: {response.status_code}")
     ratios = response.json()["aspect_ratios"]
     print(f"Available aspect ratios: {len(ratios)}")
@@ -57,14 +61,14 @@ def test_aspect_ratios():
     print()
 
 
-def test_generate():
+async def test_generate(client: httpx.AsyncClient):
     """Test image generation."""
     print("Testing image generation...")
     print(f"Request: {json.dumps(test_request, indent=2)}")
     print()
     
     start_time = time.time()
-    response = requests.post(
+    response = await client.post(
         f"{BASE_URL}/generate",
         json=test_request,
         timeout=300,  # 5 minute timeout
@@ -95,6 +99,52 @@ def test_generate():
     print()
 
 
+async def test_generate_concurrent(client: httpx.AsyncClient, n: int = 8):
+    """Fire n concurrent generation requests and report server throughput."""
+    print(f"Testing {n} concurrent generation requests...")
+    
+    start_time = time.time()
+    # Keep going if some requests fail (e.g. time out while queued) so the rest still count
+    responses = await asyncio.gather(*[
+        client.post(f"{BASE_URL}/generate", json=test_request)
+        for _ in range(n)
+    ], return_exceptions=True)
+    elapsed = time.time() - start_time
+    
+    succeeded = [
+        r for r in responses
+        if isinstance(r, httpx.Response) and r.status_code == 200
+    ]
+    images = sum(len(r.json()["images"]) for r in succeeded)
+    print(f"Succeeded: {len(succeeded)}/{n}, failed: {n - len(succeeded)}")
+    print(f"Wall-clock time: {elapsed:.2f}s")
+    print(f"Throughput: {len(succeeded) / elapsed:.3f} requests/s, {images / elapsed:.3f} images/s")
+    
+    for r in responses:
+        if isinstance(r, Exception):
+            print(f"✗ Error: {type(r).__name__}: {r}")
+        elif r.status_code != 200:
+            print(f"✗ Error ({r.status_code}): {r.text}")
+    print()
+
+
+async def run_tests(concurrency: int):
+    """Run all tests."""
+    async with httpx.AsyncClient(timeout=600) as client:
+        # Test health
+        await test_health(client)
+        
+        # Test aspect ratios
+        await test_aspect_ratios(client)
+        
+        # Test generation
+        await test_generate(client)
+        
+        # Test throughput under concurrent load
+        if concurrency > 1:
+            await test_generate_concurrent(client, concurrency)
+
+
 def main():
     """Run all tests."""
     print("=" * 60)
@@ -102,17 +152,13 @@ def main():
     print("=" * 60)
     print()
     
+    # Concurrent load test is opt-in: pass a request count > 1 to run it
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    
     try:
-        # Test health
-        test_health()
-        
-        # Test aspect ratios
-        test_aspect_ratios()
-        
-        # Test generation
-        test_generate()
+        asyncio.run(run_tests(concurrency))
         
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         print("✗ Error: Could not connect to server")
         print("  Make sure the server is running: python server.py")
     except Exception as e: